@@ -1,30 +1,77 @@
 # main.py
 from fastapi import FastAPI, Request, HTTPException, Depends, status, Header
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.responses import Response, PlainTextResponse, JSONResponse, ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any, Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from typing import Dict, Optional, Mapping
+from types import MappingProxyType
+from contextlib import asynccontextmanager
+import os
+import re
 import time
+import math
 import secrets
-import json
+import hmac
+import orjson
 import asyncio
+import aiohttp
+from yarl import URL
+import redis.asyncio as redis
+from cachetools import TTLCache
+from redis.exceptions import NoScriptError, RedisError
 
 # Tool: Google Search for simulating data collection
 # In a real application, you would replace this with actual web scraping libraries
 # or dedicated market data APIs (e.g., news APIs, financial data APIs).
 # For this demonstration, we'll use a mock search.
+MOCK_SEARCH_RESPONSES: Mapping[str, str] = MappingProxyType({
+    "pharmaceuticals": "Recent news for pharmaceuticals in India: Strong growth in generic drugs, increased R&D investments, regulatory changes, and rising demand for healthcare. Key players like Sun Pharma, Dr. Reddy's Laboratories, and Cipla are expanding. Export opportunities in Africa and Southeast Asia. Government policies supporting 'Make in India' for pharma. Challenges include price controls and competition.",
+    "technology": "Recent news for technology in India: Booming IT services, significant startup funding, focus on AI, ML, and cybersecurity. Digital transformation driving demand. Companies like TCS, Infosys, and Wipro are leading. Fintech and EdTech sectors are experiencing rapid expansion. Talent acquisition and infrastructure development are key areas. Increased foreign investment in tech startups.",
+    "agriculture": "Recent news for agriculture in India: Monsoon season outlook, government subsidies for farmers, adoption of modern farming techniques, challenges with climate change and supply chain. Focus on crop diversification, food processing, and agritech startups. Export demand for spices, rice, and fresh produce. Initiatives like e-NAM are digitalizing markets.",
+    "automotive": "Recent news for automotive in India: Shift towards electric vehicles (EVs), increased production for domestic and export markets, supply chain disruptions from chip shortages. Strong demand for SUVs. Maruti Suzuki, Tata Motors, and Hyundai are dominant. Government incentives for EV manufacturing and adoption. Focus on reducing emissions and localizing production.",
+    "finance": "Recent news for finance in India: Digital payments boom, expansion of fintech services, rising credit demand, regulatory reforms in banking sector. Public sector banks undergoing reforms. Increased foreign direct investment in financial services. Challenges include NPAs and cybersecurity threats. UPI transactions continue to break records.",
+})
+MOCK_SEARCH_DEFAULT_RESPONSE = "No specific current data found for {}. General market trends suggest economic growth and digital adoption."
+
 def Google_Search_mock(query: str):
     """
     Simulates a Google search for market data and news.
     In a real application, this would use a proper web search API.
     """
-    mock_responses = {
-        "pharmaceuticals": f"Recent news for pharmaceuticals in India: Strong growth in generic drugs, increased R&D investments, regulatory changes, and rising demand for healthcare. Key players like Sun Pharma, Dr. Reddy's Laboratories, and Cipla are expanding. Export opportunities in Africa and Southeast Asia. Government policies supporting 'Make in India' for pharma. Challenges include price controls and competition.",
-        "technology": f"Recent news for technology in India: Booming IT services, significant startup funding, focus on AI, ML, and cybersecurity. Digital transformation driving demand. Companies like TCS, Infosys, and Wipro are leading. Fintech and EdTech sectors are experiencing rapid expansion. Talent acquisition and infrastructure development are key areas. Increased foreign investment in tech startups.",
-        "agriculture": f"Recent news for agriculture in India: Monsoon season outlook, government subsidies for farmers, adoption of modern farming techniques, challenges with climate change and supply chain. Focus on crop diversification, food processing, and agritech startups. Export demand for spices, rice, and fresh produce. Initiatives like e-NAM are digitalizing markets.",
-        "automotive": f"Recent news for automotive in India: Shift towards electric vehicles (EVs), increased production for domestic and export markets, supply chain disruptions from chip shortages. Strong demand for SUVs. Maruti Suzuki, Tata Motors, and Hyundai are dominant. Government incentives for EV manufacturing and adoption. Focus on reducing emissions and localizing production.",
-        "finance": f"Recent news for finance in India: Digital payments boom, expansion of fintech services, rising credit demand, regulatory reforms in banking sector. Public sector banks undergoing reforms. Increased foreign direct investment in financial services. Challenges include NPAs and cybersecurity threats. UPI transactions continue to break records.",
-    }
-    return mock_responses.get(query.lower(), f"No specific current data found for {query}. General market trends suggest economic growth and digital adoption.")
+    return MOCK_SEARCH_RESPONSES.get(query.lower()) or MOCK_SEARCH_DEFAULT_RESPONSE.format(query)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the shared HTTP session on startup and closes it on shutdown.
+    Reusing one session keeps connections to the Gemini API alive across requests.
+    """
+    if not GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY environment variable is not set.")
+    # Rate limits are shared through Redis when configured, otherwise kept in-process.
+    # Set up before the HTTP session so a Redis failure at startup leaves nothing unclosed.
+    app.state.redis = None
+    if REDIS_URL:
+        app.state.redis = redis.Redis.from_url(REDIS_URL)
+        try:
+            app.state.rate_limit_sha = await app.state.redis.script_load(RATE_LIMIT_SCRIPT)
+        except BaseException:
+            await app.state.redis.aclose()
+            raise
+    app.state.session = aiohttp.ClientSession(
+        timeout=GEMINI_TIMEOUT,
+        connector=aiohttp.TCPConnector(
+            limit=GEMINI_MAX_CONNECTIONS,
+            limit_per_host=GEMINI_MAX_CONNECTIONS_PER_HOST,
+            keepalive_timeout=GEMINI_KEEPALIVE_TIMEOUT
+        )
+    )
+    try:
+        yield
+    finally:
+        await app.state.session.close()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
 
 # FastAPI Application Initialization
 app = FastAPI(
@@ -32,17 +79,86 @@ app = FastAPI(
     description="A FastAPI service that analyzes market data and provides trade opportunity insights for specific sectors in India using the Gemini API.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# In-memory storage for user sessions and rate limits
-# In a real application, this would be a persistent store like Redis or a database.
-session_store: Dict[str, Dict[str, Any]] = {}
-user_rate_limits: Dict[str, Dict[str, Any]] = {}
+# Compress responses (e.g. markdown reports) for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=512)
 
 # Configuration for Rate Limiting
 RATE_LIMIT_DURATION = 60  # seconds
 RATE_LIMIT_REQUESTS = 5   # requests per duration
+RATE_LIMIT_REFILL_RATE = RATE_LIMIT_REQUESTS / RATE_LIMIT_DURATION  # tokens per second
+
+# Configuration for in-memory storage
+MAX_TRACKED_USERS = 100_000
+SESSION_TTL = 3600  # seconds
+
+# In-memory storage for user sessions and rate limits
+# In a real application, this would be a persistent store like Redis or a database.
+# Entries expire after their TTL and the least recently used are evicted when full,
+# so memory stays bounded no matter how many distinct users are seen.
+session_store: TTLCache = TTLCache(maxsize=MAX_TRACKED_USERS, ttl=SESSION_TTL)
+# Rate limit state per user: (tokens, last_refill) for a token bucket.
+# An idle bucket is full again after RATE_LIMIT_DURATION, so expiring it later loses nothing.
+user_rate_limits: TTLCache = TTLCache(maxsize=MAX_TRACKED_USERS, ttl=RATE_LIMIT_DURATION * 2)
+
+# Configuration for report caching
+REPORT_CACHE_SIZE = 1024
+REPORT_CACHE_TTL = 300  # seconds
+
+# Rendered markdown reports (UTF-8 encoded) keyed by lowercase sector name, so repeat
+# requests skip the Gemini call and the encoding step
+report_cache: TTLCache = TTLCache(maxsize=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL)
+# Report builds in progress per sector, so concurrent cache misses share a single Gemini call.
+# Each build removes itself when done, so this only holds sectors currently being built.
+report_builds: Dict[str, asyncio.Task] = {}
+
+# Valid sector names: letters, digits and spaces, bounded so prompts stay small
+SECTOR_NAME_MAX_LENGTH = 64
+# The first character must be alphanumeric, so names made only of spaces are rejected
+match_sector_name = re.compile(rf"[A-Za-z0-9][A-Za-z0-9 ]{{0,{SECTOR_NAME_MAX_LENGTH - 1}}}").fullmatch
+
+# Optional Redis connection for rate limits shared across workers and replicas
+# (e.g. redis://localhost:6379/0). Falls back to in-memory limits when unset.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Sliding-window counter executed atomically in Redis.
+# KEYS: counters for the current and previous window. ARGV: window length (ms),
+# request limit and time elapsed in the current window (ms).
+# The previous window's count is weighted by how much of it still overlaps the
+# sliding window. Returns 1 if the request is allowed, 0 if it is rejected.
+RATE_LIMIT_SCRIPT = """
+local window_ms = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local elapsed_ms = tonumber(ARGV[3])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * (1 - elapsed_ms / window_ms) + current >= limit then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], window_ms * 2)
+return 1
+"""
+
+# Configuration for the Gemini API
+# The key is read from the environment and checked at startup. The request URL is
+# parsed once here instead of on every call.
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+GEMINI_API_URL = URL(f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent").with_query(key=GEMINI_API_KEY)
+
+# Configuration for the shared Gemini HTTP session
+# The connect timeout also covers waiting for a free pooled connection, so requests
+# fail fast (503) instead of hanging when the pool is exhausted.
+GEMINI_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5)
+GEMINI_MAX_CONNECTIONS = 100
+GEMINI_MAX_CONNECTIONS_PER_HOST = 40
+GEMINI_KEEPALIVE_TIMEOUT = 30  # seconds
+GEMINI_HEADERS = {'Content-Type': 'application/json'}
 
 # Simple API Key Authentication (for demonstration purposes)
 # In a real application, use a proper authentication mechanism (e.g., OAuth2, JWT).
@@ -51,14 +167,26 @@ API_KEYS = {
     "anothersecretkeyabc": {"user_id": "analyst_beta", "name": "Analyst B"},
 }
 
+# API keys are looked up by their HMAC-SHA256 digest under a per-process secret, so
+# presented tokens are never compared byte-by-byte against the real keys and lookup
+# timing reveals nothing about them.
+API_KEY_HMAC_SECRET = secrets.token_bytes(32)
+
+def hash_api_key(token: str) -> bytes:
+    """
+    Returns the HMAC-SHA256 digest used to index an API key.
+    """
+    return hmac.digest(API_KEY_HMAC_SECRET, token.encode(), "sha256")
+
+API_KEY_INDEX = {hash_api_key(key): user_info for key, user_info in API_KEYS.items()}
+
 bearer_scheme = HTTPBearer()
 
 async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     """
     Authenticates user based on a simple API key in the Authorization Bearer header.
     """
-    token = credentials.credentials
-    user_info = API_KEYS.get(token)
+    user_info = API_KEY_INDEX.get(hash_api_key(credentials.credentials))
     if not user_info:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,30 +195,75 @@ async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depend
         )
     return user_info["user_id"]
 
-async def rate_limit_dependency(user_id: str = Depends(get_current_user_id)):
+def raise_rate_limit_exceeded(retry_after: int):
     """
-    Applies rate limiting based on user ID.
+    Raises the 429 response returned when a user exceeds their rate limit.
     """
-    current_time = time.time()
-    
-    if user_id not in user_rate_limits:
-        user_rate_limits[user_id] = {"last_reset": current_time, "request_count": 0}
-
-    user_data = user_rate_limits[user_id]
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Rate limit exceeded. Try again in {retry_after} seconds.",
+        headers={"Retry-After": str(retry_after)},
+    )
 
-    # Reset count if the duration has passed
-    if current_time - user_data["last_reset"] > RATE_LIMIT_DURATION:
-        user_data["last_reset"] = current_time
-        user_data["request_count"] = 0
-    
-    # Check if limit exceeded
-    if user_data["request_count"] >= RATE_LIMIT_REQUESTS:
+async def check_redis_rate_limit(request: Request, user_id: str):
+    """
+    Applies a sliding-window rate limit stored in Redis, shared by all workers.
+    Uses two counters per user (current and previous window), checked and
+    incremented in a single atomic script call.
+    """
+    redis_client: redis.Redis = request.app.state.redis
+    window_ms = RATE_LIMIT_DURATION * 1000
+    window, elapsed_ms = divmod(int(time.time() * 1000), window_ms)
+    # Hash tag keeps both keys of a user in the same cluster slot
+    keys = (f"rl:{{{user_id}}}:{window}", f"rl:{{{user_id}}}:{window - 1}")
+    args = (window_ms, RATE_LIMIT_REQUESTS, elapsed_ms)
+    try:
+        try:
+            allowed = await redis_client.evalsha(request.app.state.rate_limit_sha, len(keys), *keys, *args)
+        except NoScriptError:
+            # Script cache was flushed (e.g. Redis restarted), load it again
+            request.app.state.rate_limit_sha = await redis_client.script_load(RATE_LIMIT_SCRIPT)
+            allowed = await redis_client.evalsha(request.app.state.rate_limit_sha, len(keys), *keys, *args)
+    except RedisError as e:
         raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit exceeded. Try again in {int(RATE_LIMIT_DURATION - (current_time - user_data['last_reset']))} seconds.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Rate limiter unavailable: {e}"
         )
-    
-    user_data["request_count"] += 1
+
+    if not allowed:
+        raise_rate_limit_exceeded(max(1, math.ceil((window_ms - elapsed_ms) / 1000)))
+
+def check_local_rate_limit(user_id: str):
+    """
+    Applies an in-memory rate limit, local to this worker process.
+    Uses a token bucket: each user holds up to RATE_LIMIT_REQUESTS tokens, refilled
+    continuously at RATE_LIMIT_REFILL_RATE, and every request consumes one token.
+    """
+    # No await between reading and writing the bucket, so the update is atomic on the event loop
+    current_time = time.monotonic()
+    tokens, last_refill = user_rate_limits.get(user_id, (RATE_LIMIT_REQUESTS, current_time))
+
+    # Refill tokens for the time elapsed since the last request
+    tokens = min(RATE_LIMIT_REQUESTS, tokens + (current_time - last_refill) * RATE_LIMIT_REFILL_RATE)
+
+    # Check if limit exceeded
+    if tokens < 1:
+        user_rate_limits[user_id] = (tokens, current_time)
+        raise_rate_limit_exceeded(math.ceil((1 - tokens) / RATE_LIMIT_REFILL_RATE))
+
+    user_rate_limits[user_id] = (tokens - 1, current_time)
+
+async def rate_limit_dependency(request: Request, user_id: str = Depends(get_current_user_id)):
+    """
+    Applies rate limiting based on user ID.
+    Concurrent requests from the same user cannot both pass a check meant for one:
+    the Redis check runs as a single atomic script, and the in-memory check is
+    synchronous, so no other request runs between its read and write.
+    """
+    if request.app.state.redis is not None:
+        await check_redis_rate_limit(request, user_id)
+    else:
+        check_local_rate_limit(user_id)
     return user_id
 
 async def call_gemini_api(prompt: str) -> str:
@@ -98,48 +271,42 @@ async def call_gemini_api(prompt: str) -> str:
     Calls the Gemini API to generate content.
     Implements exponential backoff for retries.
     """
-    chat_history = []
-    chat_history.append({"role": "user", "parts": [{"text": prompt}]})
-    payload = {"contents": chat_history}
-    api_key = "YOUR_GEMINI_API_KEY_HERE"  
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={api_key}"
+    payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
 
     retries = 0
     max_retries = 3
     base_delay = 1  # seconds
 
+    # Shared session created in lifespan, so connections are pooled across requests
+    session: aiohttp.ClientSession = app.state.session
+
     while retries < max_retries:
         try:
-            # Using httpx for async requests within FastAPI
-            import httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    api_url,
-                    headers={'Content-Type': 'application/json'},
-                    json=payload,
-                    timeout=30 # Add a timeout for the API call
-                )
+            async with session.post(
+                GEMINI_API_URL,
+                headers=GEMINI_HEADERS,
+                data=orjson.dumps(payload)
+            ) as response:
                 response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-            
-            result = response.json()
+                result = orjson.loads(await response.read())
 
-            if result.get("candidates") and result["candidates"][0].get("content") and result["candidates"][0]["content"].get("parts"):
+            try:
                 return result["candidates"][0]["content"]["parts"][0]["text"]
-            else:
+            except (KeyError, IndexError, TypeError) as e:
                 # Handle cases where the response structure is unexpected
-                raise ValueError(f"Unexpected Gemini API response structure: {result}")
+                raise ValueError(f"Unexpected Gemini API response structure: {result}") from e
 
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429 and retries < max_retries - 1:
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429 and retries < max_retries - 1:
                 delay = base_delay * (2 ** retries)
                 retries += 1
                 await asyncio.sleep(delay)
                 continue
             raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Gemini API HTTP Error: {e.response.text}"
+                status_code=e.status,
+                detail=f"Gemini API HTTP Error: {e.message}"
             )
-        except httpx.RequestError as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             if retries < max_retries - 1:
                 delay = base_delay * (2 ** retries)
                 retries += 1
@@ -149,7 +316,7 @@ async def call_gemini_api(prompt: str) -> str:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Gemini API Request Error: {e}"
             )
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError) as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error parsing Gemini API response: {e}"
@@ -165,19 +332,16 @@ async def call_gemini_api(prompt: str) -> str:
     )
 
 
-def generate_markdown_report(sector: str, market_data: str, ai_analysis: str) -> str:
-    """
-    Generates a structured markdown report from market data and AI analysis.
-    """
-    report_content = f"""# Market Analysis Report: {sector.title()} Sector in India
+# Markdown report template, built once at import and filled in per request
+REPORT_TEMPLATE = """# Market Analysis Report: {sector_title} Sector in India
 
-**Date:** {time.strftime('%Y-%m-%d %H:%M:%S IST')}
+**Date:** {timestamp}
 
 ---
 
 ## 📊 Current Market Data & News Summary
 
-The following information was gathered from recent market data and news articles related to the {sector.title()} sector in India:
+The following information was gathered from recent market data and news articles related to the {sector_title} sector in India:
 
 {market_data}
 
@@ -185,7 +349,7 @@ The following information was gathered from recent market data and news articles
 
 ## 📈 AI-Powered Trade Opportunity Insights
 
-Based on the latest market information, our AI model (Gemini) provides the following insights and potential trade opportunities for the {sector.title()} sector:
+Based on the latest market information, our AI model (Gemini) provides the following insights and potential trade opportunities for the {sector_title} sector:
 
 {ai_analysis}
 
@@ -202,7 +366,60 @@ Based on the latest market information, our AI model (Gemini) provides the follo
 
 **Disclaimer:** This report is generated by an AI model based on available data and should not be considered financial advice. Always conduct your own thorough research and consult with financial professionals before making any investment decisions.
 """
-    return report_content
+
+def generate_markdown_report(sector: str, market_data: str, ai_analysis: str) -> str:
+    """
+    Generates a structured markdown report from market data and AI analysis.
+    """
+    return REPORT_TEMPLATE.format_map({
+        "sector_title": sector.title(),
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S IST'),
+        "market_data": market_data,
+        "ai_analysis": ai_analysis,
+    })
+
+async def build_sector_report(sector: str) -> str:
+    """
+    Collects market data for a sector, analyzes it with Gemini and renders the markdown report.
+    """
+    # Step 2: Search for current market data/news for that sector
+    # IMPORTANT: In a real app, this would be a robust web scraping or news API call.
+    # For this example, we're using a mock search.
+    market_data_prompt = f"Find recent market data, news headlines, and key trends for the {sector} sector in India, specifically looking for information that highlights trade opportunities or challenges. Summarize briefly."
+    
+    # Using the provided Google Search_mock as a placeholder for data collection.
+    # The mock is a local lookup; retries for a real search API belong in its client.
+    data_collection_result = Google_Search_mock(sector)
+    if not data_collection_result:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to collect market data for the specified sector."
+        )
+
+    # Step 3: Use Gemini API to analyze collected information
+    analysis_prompt = f"""Analyze the following market data for the {sector} sector in India.
+    Identify key trends, growth drivers, challenges, and specific trade or investment opportunities.
+    Focus on actionable insights.
+    Market Data:
+    {data_collection_result}
+    
+    Please provide a concise analysis, highlighting trade opportunities, in plain text format suitable for a markdown report.
+    """
+    ai_analysis_text = await call_gemini_api(analysis_prompt)
+
+    # Step 4: Generate a structured markdown report
+    return generate_markdown_report(sector, data_collection_result, ai_analysis_text)
+
+async def build_and_cache_report(sector_key: str) -> bytes:
+    """
+    Builds the report for a sector, stores it UTF-8 encoded in the report cache and clears the in-flight entry.
+    """
+    try:
+        markdown_report = (await build_sector_report(sector_key)).encode("utf-8")
+        report_cache[sector_key] = markdown_report
+        return markdown_report
+    finally:
+        report_builds.pop(sector_key, None)
 
 # Main API Endpoint
 @app.get("/analyze/{sector}", response_class=PlainTextResponse)
@@ -218,66 +435,32 @@ async def analyze_sector(
     """
     try:
         # Step 1: Accept sector name as input (handled by FastAPI path parameter)
-        if not sector or not isinstance(sector, str):
+        # Input Validation: ensure sector is a non-empty, bounded alphanumeric/safe string
+        if not match_sector_name(sector):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Sector name must be a non-empty string."
+                detail=f"Invalid sector name. Only alphanumeric characters and spaces are allowed (max {SECTOR_NAME_MAX_LENGTH} characters)."
             )
-        
-        # Input Validation example: ensure sector is alphanumeric/safe
-        if not sector.replace(" ", "").isalnum(): # Allow spaces, but check alphanumeric otherwise
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid sector name. Only alphanumeric characters and spaces are allowed."
-            )
-
-        # Step 2: Search for current market data/news for that sector
-        # IMPORTANT: In a real app, this would be a robust web scraping or news API call.
-        # For this example, we're using a mock search.
-        market_data_prompt = f"Find recent market data, news headlines, and key trends for the {sector} sector in India, specifically looking for information that highlights trade opportunities or challenges. Summarize briefly."
-        
-        # Using the provided Google Search_mock as a placeholder for data collection
-        retries = 0
-        max_retries = 3
-        data_collection_result = None
-        while retries < max_retries:
-            try:
-                data_collection_result = Google_Search_mock(sector) # Using the mock function
-                if data_collection_result:
-                    break
-            except Exception as e:
-                retries += 1
-                if retries < max_retries:
-                    await asyncio.sleep(2 ** retries) # Exponential backoff for mock data
-                else:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Failed to collect market data after multiple retries: {e}"
-                    )
-        
-        if not data_collection_result:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to collect market data for the specified sector."
-            )
-
-        # Step 3: Use Gemini API to analyze collected information
-        analysis_prompt = f"""Analyze the following market data for the {sector} sector in India.
-        Identify key trends, growth drivers, challenges, and specific trade or investment opportunities.
-        Focus on actionable insights.
-        Market Data:
-        {data_collection_result}
-        
-        Please provide a concise analysis, highlighting trade opportunities, in plain text format suitable for a markdown report.
-        """
-        ai_analysis_text = await call_gemini_api(analysis_prompt)
 
-        # Step 4: Generate a structured markdown report
-        markdown_report = generate_markdown_report(sector, data_collection_result, ai_analysis_text)
+        # Steps 2-4: Collect data, analyze it and build the report, unless a recent one is cached
+        sector_key = sector.lower()
+        markdown_report = report_cache.get(sector_key)
+        if markdown_report is None:
+            # Join a build already in flight for this sector, or start one.
+            # No await between the lookup and the insert, so only one build can start.
+            build = report_builds.get(sector_key)
+            if build is None:
+                build = report_builds[sector_key] = asyncio.create_task(build_and_cache_report(sector_key))
+                # Mark the outcome as retrieved, so a failed build whose waiters all disconnected
+                # does not log "Task exception was never retrieved"
+                build.add_done_callback(lambda task: task.cancelled() or task.exception())
+            # Shielded so a disconnecting client does not cancel the build shared with other requests
+            markdown_report = await asyncio.shield(build)
 
         # Step 5: Apply rate limiting and security measures (handled by rate_limit_dependency)
 
-        return PlainTextResponse(content=markdown_report, media_type="text/markdown")
+        # The report is already encoded, so it is sent as-is
+        return Response(content=markdown_report, media_type="text/markdown; charset=utf-8")
 
     except HTTPException as e:
         # Re-raise HTTPExceptions as they contain appropriate status codes and details
@@ -292,8 +475,9 @@ async def analyze_sector(
 # Example of how to run this file:
 # 1. Save this code as `main.py`
 # 2. Make sure you have FastAPI and Uvicorn installed:
-#    pip install fastapi uvicorn httpx
-# 3. Run the application from your terminal:
+#    pip install fastapi uvicorn aiohttp redis cachetools orjson
+# 3. Set your Gemini API key and run the application from your terminal:
+#    export GEMINI_API_KEY="your-api-key"
 #    uvicorn main:app --reload --host 0.0.0.0 --port 8000
 #
 # Then, you can access the API documentation at http://localhost:8000/docs